@@ -1,76 +1,244 @@
 from flask import Flask, flash, redirect, render_template, request, url_for, jsonify
-import psycopg2
-from psycopg2 import errors, IntegrityError
-from db_config import DB_CONFIG
+from flask.json.provider import DefaultJSONProvider
+from flask_caching import Cache
+import orjson
+from psycopg2 import errors, IntegrityError, extensions
+from psycopg2.extras import RealDictCursor
+from db_config import USE_SERVER_PREPARE, connection
 from datetime import date
+from threading import Lock
+from cachetools import TTLCache, cached
 import os
 from data_ingestion import load_production_data_if_needed
 from analytics import (
-    init_analytics_views, get_market_overview, get_host_performance,
-    get_neighbourhood_analytics, get_price_trends, get_top_listings,
-    refresh_analytics_views
+    init_analytics_views, get_host_performance, get_neighbourhood_analytics,
+    get_price_trends, get_dashboard_data, refresh_analytics_views
 )
 # Import recommendation module (modular - can be easily removed)
 from recommendations import recommendation_engine
 
 
+# Serializes jsonify() responses with orjson, several times faster than the stdlib
+# json module on the larger /api/analytics payloads. Types orjson does not know
+# (e.g. Decimal) fall back to Flask's default conversions.
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj, default=self.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 # Secret key for session/flash support (set this to a secure random value)
 app.secret_key = os.urandom(24)
 
-def get_db_connection():
-    conn = psycopg2.connect(**DB_CONFIG)
-    return conn
+# Cache for the read-only /api/analytics/* responses. Shared through Redis when
+# REDIS_URL is set, otherwise kept in each worker's memory.
+REDIS_URL = os.environ.get('REDIS_URL')
+cache = Cache(app, config={
+    'CACHE_TYPE': 'RedisCache' if REDIS_URL else 'SimpleCache',
+    'CACHE_REDIS_URL': REDIS_URL,
+})
+ANALYTICS_CACHE_TIMEOUT = 60
+ANALYTICS_CACHE_KEYS = (
+    'api_analytics_all', 'api_analytics_host_performance',
+    'api_analytics_price_trends', 'api_analytics_neighbourhood',
+)
 
-# Initializes the database schema from data.sql.
+# The analytics getters return empty results on error, so a payload is only
+# complete if it is non-empty and, for the dashboard, every section is too.
+def analytics_complete(data):
+    if isinstance(data, dict):
+        return bool(data) and all(data.values())
+    return bool(data)
+
+# Returns analytics data from the cache, running fetch() on a miss.
+# Incomplete results are not cached.
+def cached_analytics(key, fetch):
+    data = cache.get(key)
+    if data is None:
+        data = fetch()
+        if analytics_complete(data):
+            cache.set(key, data, timeout=ANALYTICS_CACHE_TIMEOUT)
+    return data
+
+# JSON response that browsers and CDNs may also reuse for the cache lifetime
+# (incomplete payloads are marked no-store instead).
+def analytics_json(data):
+    response = jsonify(data)
+    if analytics_complete(data):
+        response.cache_control.public = True
+        response.cache_control.max_age = ANALYTICS_CACHE_TIMEOUT
+    else:
+        response.cache_control.no_store = True
+    return response
+
+# Return NUMERIC/DECIMAL columns as Python floats straight from the driver, so
+# rows can be used without converting each Decimal value by hand.
+DEC2FLOAT = extensions.new_type(
+    extensions.DECIMAL.values, 'DEC2FLOAT',
+    lambda value, cur: float(value) if value is not None else None
+)
+extensions.register_type(DEC2FLOAT)
+
+# Static hot-path queries, prepared once per pooled connection so Postgres
+# does not re-parse and re-plan them on every request.
+_PREPARED_STATEMENTS = {
+    'home_top3': """
+        SELECT m.listing_id, m.name, m.price, m.neighbourhood,
+               m.minimum_nights AS min_nights, m.avg_rating
+        FROM mv_listing_stats m
+        ORDER BY m.avg_rating DESC, m.price ASC
+        LIMIT 3
+    """,
+    # Both dropdowns in one round trip, tagged 'n' (neighbourhood) or 'r' (room type)
+    'filter_options': """
+        SELECT DISTINCT 'n' AS kind, name FROM Neighbourhood
+        UNION ALL
+        SELECT DISTINCT 'r', room_type FROM Listing WHERE room_type IS NOT NULL
+        ORDER BY 1, 2
+    """,
+    'mark_notification_read': "UPDATE HostNotifications SET is_read = true WHERE notification_id = %s",
+    'upd_host_referral': "UPDATE Host SET referred_by = %s, is_superhost = %s WHERE host_id = %s",
+}
+
+# Runs one of _PREPARED_STATEMENTS, preparing it on this connection first if needed.
+def execute_prepared(cur, name, params=()):
+    sql = _PREPARED_STATEMENTS[name]
+    if not USE_SERVER_PREPARE:
+        cur.execute(sql, params)
+        return
+    conn = cur.connection
+    if name not in conn.prepared:
+        # PREPARE takes $n placeholders instead of psycopg2's %s
+        parts = sql.split('%s')
+        sql = parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], start=1))
+        cur.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+# Dropdown options for view_listings change far less often than the page is
+# loaded, so they are cached per worker for 5 minutes.
+_filter_options_cache = TTLCache(maxsize=1, ttl=300)
+_filter_options_lock = Lock()
+
+@cached(_filter_options_cache, lock=_filter_options_lock)
+def _get_filter_options():
+    with connection() as conn, conn.cursor() as cur:
+        execute_prepared(cur, 'filter_options')
+        rows = cur.fetchall()
+    neighbourhoods = [value for kind, value in rows if kind == 'n']
+    room_types = [value for kind, value in rows if kind == 'r']
+    return neighbourhoods, room_types
+
+# Drops the cached dropdown options after listings are added, changed or removed.
+def invalidate_filter_options():
+    with _filter_options_lock:
+        _filter_options_cache.clear()
+
+# Host dropdowns on the referral pages, cached per worker for a minute since
+# hosts are rarely added or renamed.
+_host_dropdown_cache = TTLCache(maxsize=1, ttl=60)
+_host_dropdown_lock = Lock()
+
+@cached(_host_dropdown_cache, lock=_host_dropdown_lock)
+def _load_host_dropdown():
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT host_id, host_name FROM Host ORDER BY host_id")
+        return cur.fetchall()
+
+# Drops the cached host dropdown after hosts are added, changed or removed.
+def invalidate_host_dropdown():
+    with _host_dropdown_lock:
+        _host_dropdown_cache.clear()
+
+# Initializes the database schema from data.sql, then applies migrate_db() for the
+# triggers and indexes defined there.
 def init_db():
-    conn = get_db_connection()
-    cur = conn.cursor()
     with open('data.sql', 'r') as f:
         ddl_script = f.read()
     
     # Execute the entire script at once to handle dollar-quoted strings properly
-    cur.execute(ddl_script)
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(ddl_script)
+        conn.commit()
+    migrate_db()
+
+# Indexes added since the first release, keyed by name (data.sql does not create them).
+# migrate_db() builds them with CREATE INDEX CONCURRENTLY so live traffic keeps writing.
+_MIGRATION_INDEXES = {
+    'idx_listing_minimum_nights': "Listing(minimum_nights)",
+    'idx_listing_name_trgm': "Listing USING GIN (name gin_trgm_ops)",
+    'idx_neighbourhood_name_trgm': "Neighbourhood USING GIN (name gin_trgm_ops)",
+    # Plain foreign key indexes: host pages and the notification trigger look up by
+    # host_id, and rename_host_referrer by referred_by; network queries use referral_path
+    'idx_listing_host_id': "Listing(host_id)",
+    'idx_host_referred_by': "Host(referred_by)",
+    'idx_host_referral_path': "Host USING GIST (referral_path)",
+}
+# Indexes from earlier releases that no current query uses.
+_SUPERSEDED_INDEXES = ['idx_listing_host_id_price', 'idx_host_referral_network']
+
+# Brings the database up to the current schema: migrations.sql for columns, sequences
+# and triggers, then the indexes above. Safe to re-run.
+def migrate_db():
+    with open('migrations.sql', 'r') as f:
+        migration_script = f.read()
+
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(migration_script)
+        conn.commit()
+
+        # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        try:
+            # Rebuild indexes whose INCLUDE columns differ from the definitions above
+            # (earlier covering versions), and any index left invalid by an
+            # interrupted concurrent build
+            cur.execute("""
+                SELECT c.relname, i.indisvalid, pg_get_indexdef(i.indexrelid)
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                JOIN pg_namespace ns ON ns.oid = c.relnamespace
+                WHERE ns.nspname = 'public' AND c.relname = ANY(%s)
+            """, (list(_MIGRATION_INDEXES),))
+            stale = [name for name, valid, indexdef in cur.fetchall()
+                     if not valid or (('INCLUDE' in _MIGRATION_INDEXES[name])
+                                      != ('INCLUDE' in indexdef))]
+            for name in stale + _SUPERSEDED_INDEXES:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            for name, definition in _MIGRATION_INDEXES.items():
+                cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+        finally:
+            # Pooled connections are expected back in transactional mode
+            conn.autocommit = False
 
 
 # Route for homepage.
 @app.route('/')
 def home():
     # Fetch top 3 listings per neighbourhood by avg rating DESC, price ASC
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""
-    SELECT
-    l.listing_id,
-    l.name,
-    l.price,
-    n.name AS neighbourhood,
-    l.minimum_nights AS min_nights,
-    COALESCE(AVG(r.rating), 0) AS avg_rating
-    FROM Listing l
-    JOIN Neighbourhood n ON n.listing_id = l.listing_id
-    LEFT JOIN Review r ON r.listing_id = l.listing_id
-    GROUP BY l.listing_id, l.name, l.price, n.name
-    ORDER BY avg_rating DESC, l.price ASC
-    LIMIT 3;
-    """)
-    rows = cur.fetchall()
+    with connection() as conn, conn.cursor() as cur:
+        execute_prepared(cur, 'home_top3')
+        rows = cur.fetchall()
     top_listings = [
         {
             "listing_id":    r[0],
             "name":          r[1],
-            "price":         float(r[2]),
+            "price":         r[2],
             "neighbourhood": r[3],
             "min_nights":    r[4],
-            "avg_rating":    float(r[5]),
+            "avg_rating":    r[5],
         }
         for r in rows
     ]
-    cur.close()
-    conn.close()
     
     return render_template("home.html", top_listings=top_listings)
 
@@ -78,19 +246,9 @@ def home():
 @app.route('/analytics')
 def analytics_dashboard():
     try:
-        market_overview = get_market_overview()
-        host_performance = get_host_performance(limit=15)
-        neighbourhood_analytics = get_neighbourhood_analytics(limit=20)
-        price_trends = get_price_trends()
-        top_performing_listings = get_top_listings(limit=15)
-        
-        analytics_data = {
-            'market_overview': market_overview,
-            'host_performance': host_performance,
-            'neighbourhood_analytics': neighbourhood_analytics,
-            'price_trends': price_trends,
-            'top_performing_listings': top_performing_listings
-        }
+        analytics_data = get_dashboard_data(
+            host_limit=15, neighbourhood_limit=20, listing_limit=15
+        )
     except Exception as e:
         print(f"Error fetching analytics data: {e}")
         analytics_data = {}
@@ -101,19 +259,9 @@ def analytics_dashboard():
 @app.route('/api/analytics')
 def api_analytics():
     try:
-        market_overview = get_market_overview()
-        host_performance = get_host_performance(limit=50)
-        neighbourhood_analytics = get_neighbourhood_analytics(limit=50)
-        price_trends = get_price_trends()
-        top_performing_listings = get_top_listings(limit=50)
-        
-        return jsonify({
-            'market_overview': market_overview,
-            'host_performance': host_performance,
-            'neighbourhood_analytics': neighbourhood_analytics,
-            'price_trends': price_trends,
-            'top_performing_listings': top_performing_listings
-        })
+        return analytics_json(cached_analytics('api_analytics_all', lambda: get_dashboard_data(
+            host_limit=50, neighbourhood_limit=50, listing_limit=50
+        )))
     except Exception as e:
         print(f"Error fetching analytics data: {e}")
         return jsonify({'error': 'Failed to fetch analytics data'}), 500
@@ -122,8 +270,10 @@ def api_analytics():
 @app.route('/api/analytics/host-performance')
 def api_host_performance():
     try:
-        host_performance = get_host_performance(limit=50)
-        return jsonify(host_performance)
+        host_performance = cached_analytics(
+            'api_analytics_host_performance', lambda: get_host_performance(limit=50)
+        )
+        return analytics_json(host_performance)
     except Exception as e:
         print(f"Error fetching host performance data: {e}")
         return jsonify({'error': 'Failed to fetch host performance data'}), 500
@@ -132,8 +282,8 @@ def api_host_performance():
 @app.route('/api/analytics/price-trends')
 def api_price_trends():
     try:
-        price_trends = get_price_trends()
-        return jsonify(price_trends)
+        price_trends = cached_analytics('api_analytics_price_trends', get_price_trends)
+        return analytics_json(price_trends)
     except Exception as e:
         print(f"Error fetching price trends data: {e}")
         return jsonify({'error': 'Failed to fetch price trends data'}), 500
@@ -142,8 +292,10 @@ def api_price_trends():
 @app.route('/api/analytics/neighbourhood')
 def api_neighbourhood_analytics():
     try:
-        neighbourhood_analytics = get_neighbourhood_analytics(limit=50)
-        return jsonify(neighbourhood_analytics)
+        neighbourhood_analytics = cached_analytics(
+            'api_analytics_neighbourhood', lambda: get_neighbourhood_analytics(limit=50)
+        )
+        return analytics_json(neighbourhood_analytics)
     except Exception as e:
         print(f"Error fetching neighbourhood analytics data: {e}")
         return jsonify({'error': 'Failed to fetch neighbourhood analytics data'}), 500
@@ -152,7 +304,9 @@ def api_neighbourhood_analytics():
 @app.route('/refresh-analytics')
 def refresh_analytics():
     try:
-        success = refresh_analytics_views()
+        # ?view=<name> refreshes a single materialized view instead of all of them
+        success = refresh_analytics_views(request.args.get('view', type=str))
+        cache.delete_many(*ANALYTICS_CACHE_KEYS)
         if success:
             flash('Analytics data refreshed successfully!', 'success')
         else:
@@ -165,42 +319,43 @@ def refresh_analytics():
 # Route to add sample data to the listings database.
 @app.route('/add-sample')
 def add_sample():
-    conn = get_db_connection()
-    cur = conn.cursor()
     message = "Sample data inserted successfully."
 
     try:
         with open('sample.sql', 'r') as f:
             sql_script = f.read()
 
-        for stmt in sql_script.split(';'):
-            stmt = stmt.strip()
-            if not stmt:
-                continue
-            cur.execute(stmt + ';')
-
-        conn.commit()
+        # Send the whole script in one round trip; the connection context
+        # commits it atomically or rolls it back on error.
+        with connection() as conn:
+            with conn, conn.cursor() as cur:
+                cur.execute(sql_script)
+        invalidate_filter_options()
+        invalidate_host_dropdown()
 
     except IntegrityError as e:
-        conn.rollback()
         # If it's a duplicate‐key error, let the user know the data was already added
         if isinstance(e, errors.UniqueViolation):
             message = "Sample data has already been added."
         else:
             message = f"Error inserting sample data: {e.pgerror}"
-            
-    finally:
-        cur.close()
-        conn.close()
 
     return render_template('add_sample.html', message=message)
 
+# The only ORDER BY clauses view_listings can emit, keyed by (sort_by, sort_order).
+# User input only selects a key, so the query text comes from this fixed set.
+_LISTING_ORDER_BY = {
+    ('price', 'asc'):  "\n  ORDER BY m.price ASC",
+    ('price', 'desc'): "\n  ORDER BY m.price DESC",
+    ('name', 'asc'):   "\n  ORDER BY m.name ASC",
+    ('name', 'desc'):  "\n  ORDER BY m.name DESC",
+    # default ordering; matches idx_listing_stats_top (avg_rating is never NULL in the view)
+    None:              "\n  ORDER BY m.avg_rating DESC, m.price ASC",
+}
+
 # Route for viewing the listings with search, sort, and filter functionality.
 @app.route('/view-listings')
 def view_listings():
-    conn = get_db_connection()
-    cur = conn.cursor()
-
     # 1. Read all params
     search = request.args.get('search', type=str)
     neighbourhood = request.args.get('neighbourhood', type=str)
@@ -217,29 +372,21 @@ def view_listings():
     page          = request.args.get('page', type=int) or 1
     per_page      = 20
 
-    # 2. Build base query (join on Neighbourhood.listing_id)
+    # 2. Build base query (per-listing aggregates are precomputed in mv_listing_stats)
     base_query = """
     SELECT
-      l.listing_id,
-      l.name,
-      l.price,
-      l.room_type,
-      l.minimum_nights,
-      n.name             AS neighbourhood,
-      AVG(r.rating)      AS avg_rating,
-      COUNT(r.review_id) AS review_count,
-      ST_Y(l.geopoint::geometry) AS lat,
-      ST_X(l.geopoint::geometry) AS lng
-    FROM Listing l
-    JOIN Neighbourhood n
-      ON n.listing_id = l.listing_id
-    LEFT JOIN Review r
-      ON r.listing_id = l.listing_id
-    """
-
-    group_by = """
-      GROUP BY
-        l.listing_id, l.name, l.price, l.room_type, n.name
+      m.listing_id,
+      m.name,
+      m.price,
+      m.room_type,
+      m.minimum_nights,
+      m.neighbourhood,
+      m.avg_rating,
+      m.review_count,
+      m.lat,
+      m.lng,
+      COUNT(*) OVER () AS total_count
+    FROM mv_listing_stats m
     """
 
     where_clauses = []
@@ -248,24 +395,24 @@ def view_listings():
     # 3a. Search listing name and neighbourhood based on pattern entered by user.
     if search:
         wildcard = f"%{search}%"
-        where_clauses.append("(l.name ILIKE %s OR n.name ILIKE %s)")
+        where_clauses.append("(m.name ILIKE %s OR m.neighbourhood ILIKE %s)")
         params.extend([wildcard, wildcard])
 
     # 3b. Apply filters (if provided)
     if neighbourhood:
-        where_clauses.append("n.name = %s")
+        where_clauses.append("m.neighbourhood = %s")
         params.append(neighbourhood)
     if room_type:
-        where_clauses.append("l.room_type = %s")
+        where_clauses.append("m.room_type = %s")
         params.append(room_type)
     if price_min is not None:
-        where_clauses.append("l.price >= %s")
+        where_clauses.append("m.price >= %s")
         params.append(price_min)
     if price_max is not None:
-        where_clauses.append("l.price <= %s")
+        where_clauses.append("m.price <= %s")
         params.append(price_max)
     if min_nights is not None:
-        where_clauses.append("l.minimum_nights >= %s")
+        where_clauses.append("m.minimum_nights >= %s")
         params.append(min_nights)
     
     # 3c. Geospatial filter
@@ -273,7 +420,7 @@ def view_listings():
         radius_m = radius_km * 1000
         where_clauses.append("""
           ST_DWithin(
-            l.geopoint,
+            m.geopoint,
             ST_SetSRID(
               ST_MakePoint(%s, %s), 4326
             )::geography,
@@ -283,62 +430,54 @@ def view_listings():
         params.extend([user_lng, user_lat, radius_m])
 
     # 4. Stitching the query together.
-    where_sql = ""
     if where_clauses:
-        where_sql = " WHERE " + " AND ".join(where_clauses)
-        base_query += where_sql
-    base_query += group_by
-
-    if sort_by == 'price':
-        direction = 'ASC' if sort_order == 'asc' else 'DESC'
-        base_query += f"\n  ORDER BY l.price {direction}"
-    elif sort_by == 'name':
-        direction = 'ASC' if sort_order == 'asc' else 'DESC'
-        base_query += f"\n  ORDER BY l.name {direction}"
+        base_query += " WHERE " + " AND ".join(where_clauses)
+
+    if sort_by in ('price', 'name'):
+        base_query += _LISTING_ORDER_BY[(sort_by, 'asc' if sort_order == 'asc' else 'desc')]
     else:
-       # default ordering
-        base_query += """
-        ORDER BY avg_rating DESC NULLS LAST,
-        l.price ASC
-        """
+        base_query += _LISTING_ORDER_BY[None]
     base_query += f"\nLIMIT %s OFFSET %s;" # End of query
     params_with_pagination = params + [per_page, (page-1)*per_page]
 
     # 5. Execute and fetch
-    cur.execute(base_query, params_with_pagination)
-    rows = cur.fetchall()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(base_query, params_with_pagination)
+        rows = cur.fetchall()
     listings = [
         {
           'listing_id':   r[0],
           'name':         r[1],
-          'price':        float(r[2]),
+          'price':        r[2],
           'room_type':    r[3],
           'min_nights':   r[4],
           'neighbourhood':r[5],
-          'avg_rating':   round(float(r[6]), 2) if r[6] is not None else None,
-          'review_count': int(r[7]),
-          'lat':          float(r[8]),
-          'lng':          float(r[9])
+          'avg_rating':   round(r[6], 2) if r[6] else None,
+          'review_count': r[7],
+          'lat':          r[8],
+          'lng':          r[9]
         }
         for r in rows
     ]
 
-    # 6. Fetch total count for pagination
-    count_query = f"SELECT COUNT(*) FROM (SELECT l.listing_id FROM Listing l JOIN Neighbourhood n ON n.listing_id = l.listing_id LEFT JOIN Review r ON r.listing_id = l.listing_id {where_sql} {group_by}) AS sub;"
-    cur.execute(count_query, params)
-    total_count = cur.fetchone()[0]
+    # 6. Total count for pagination comes from the window column of the same scan;
+    # a page past the end has no rows to read it from, so count separately then
+    if rows:
+        total_count = rows[0][10]
+    elif page > 1:
+        count_query = "SELECT COUNT(*) FROM mv_listing_stats m"
+        if where_clauses:
+            count_query += " WHERE " + " AND ".join(where_clauses)
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(count_query, params)
+            total_count = cur.fetchone()[0]
+    else:
+        total_count = 0
     total_pages = (total_count + per_page - 1) // per_page
     total_pages = max(1, total_pages) # Prevents weird numbering when no entries are found.
 
-    # 7. Fetch distinct options for your filter dropdowns
-    cur.execute("SELECT DISTINCT name FROM Neighbourhood ORDER BY name;")
-    neighbourhoods = [n[0] for n in cur.fetchall()]
-
-    cur.execute("SELECT DISTINCT room_type FROM Listing WHERE room_type IS NOT NULL ORDER BY room_type;")
-    room_types = [rt[0] for rt in cur.fetchall()]
-
-    cur.close()
-    conn.close()
+    # 7. Fetch distinct options for your filter dropdowns (cached)
+    neighbourhoods, room_types = _get_filter_options()
 
     # 8. Render with everything the template needs
     return render_template(
@@ -367,40 +506,32 @@ def view_listings():
 # Route to add listings from users (currently an admin user)
 @app.route('/add-listing', methods=['GET', 'POST'])
 def add_listing():
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    if request.method == 'POST':
-        # 1. read form data
-        listing_id        = request.form.get('listing_id', type=int)
-        host_id           = request.form.get('host_id', type=int)
-        name              = request.form.get('name')
-        description       = request.form.get('description')
-        neighbourhood_overview = request.form.get('neighbourhood_overview')
-        room_type         = request.form.get('room_type')
-        accommodates      = request.form.get('accommodates', type=int)
-        bathrooms         = request.form.get('bathrooms', type=float)
-        bathrooms_text    = request.form.get('bathrooms_text')
-        bedrooms          = request.form.get('bedrooms', type=int)
-        beds              = request.form.get('beds', type=int)
-        price             = request.form.get('price', type=float)
-        minimum_nights    = request.form.get('minimum_nights', type=int)
-        maximum_nights    = request.form.get('maximum_nights', type=int)
-        instant_bookable  = bool(request.form.get('instant_bookable'))
-        created_date      = date.today()
-        last_scraped      = date.today()
-        neighbourhood_id  = 0
-        neighbourhood_name = request.form.get('neighbourhood_name')
-        neighbourhood_group = request.form.get('neighbourhood_group')
-        latitude = request.form.get('latitude', type=float)
-        longitude = request.form.get('longitude', type=float)
-
-        # 2. Check for duplicate listing_id
-        cur.execute('SELECT 1 FROM Listing WHERE listing_id = %s;', (listing_id,))
-        if cur.fetchone():
-            flash(f'Error: Listing ID {listing_id} already exists.', 'error')
-        else:
-            # 3. insert into Listing
+    with connection() as conn, conn.cursor() as cur:
+        if request.method == 'POST':
+            # 1. read form data
+            listing_id        = request.form.get('listing_id', type=int)
+            host_id           = request.form.get('host_id', type=int)
+            name              = request.form.get('name')
+            description       = request.form.get('description')
+            neighbourhood_overview = request.form.get('neighbourhood_overview')
+            room_type         = request.form.get('room_type')
+            accommodates      = request.form.get('accommodates', type=int)
+            bathrooms         = request.form.get('bathrooms', type=float)
+            bathrooms_text    = request.form.get('bathrooms_text')
+            bedrooms          = request.form.get('bedrooms', type=int)
+            beds              = request.form.get('beds', type=int)
+            price             = request.form.get('price', type=float)
+            minimum_nights    = request.form.get('minimum_nights', type=int)
+            maximum_nights    = request.form.get('maximum_nights', type=int)
+            instant_bookable  = bool(request.form.get('instant_bookable'))
+            created_date      = date.today()
+            last_scraped      = date.today()
+            neighbourhood_name = request.form.get('neighbourhood_name')
+            neighbourhood_group = request.form.get('neighbourhood_group')
+            latitude = request.form.get('latitude', type=float)
+            longitude = request.form.get('longitude', type=float)
+
+            # 2. insert into Listing; an existing listing_id makes ON CONFLICT skip the insert
             try:
                 cur.execute(
                     '''INSERT INTO Listing (
@@ -414,42 +545,41 @@ def add_listing():
                                ST_SetSRID(
                                ST_MakePoint(%s, %s), 4326
                                )::geography
-                              )''',
+                              )
+                       ON CONFLICT (listing_id) DO NOTHING
+                       RETURNING listing_id''',
                     (listing_id, host_id, name, description,
                      neighbourhood_overview, room_type, accommodates,
                      bathrooms, bathrooms_text, bedrooms, beds,
                      price, minimum_nights, maximum_nights,
                      instant_bookable, created_date, last_scraped, longitude, latitude)
                 )
-                cur.execute(
-                    'SELECT COALESCE(MAX(neighbourhood_id), 0) + 1 FROM Neighbourhood;'
-                )
-                neighbourhood_id = cur.fetchone()[0]
-                cur.execute(
-                    '''INSERT INTO Neighbourhood (
-                        neighbourhood_id, listing_id, name, neighbourhood_group,
-                        latitude, longitude)
-                    VALUES (%s, %s, %s, %s, %s, %s)''',
-                    (neighbourhood_id, listing_id, neighbourhood_name, neighbourhood_group,
-                    latitude or None, longitude or None)
-                )
-                conn.commit()
-                flash('Listing created successfully!', 'success')
-                conn.close()
-                return redirect(url_for('view_listings'))
+                if cur.rowcount == 0:
+                    flash(f'Error: Listing ID {listing_id} already exists.', 'error')
+                else:
+                    # neighbourhood_id is assigned by its sequence
+                    cur.execute(
+                        '''INSERT INTO Neighbourhood (
+                            listing_id, name, neighbourhood_group,
+                            latitude, longitude)
+                        VALUES (%s, %s, %s, %s, %s)''',
+                        (listing_id, neighbourhood_name, neighbourhood_group,
+                        latitude or None, longitude or None)
+                    )
+                    conn.commit()
+                    invalidate_filter_options()
+                    flash('Listing created successfully!', 'success')
+                    return redirect(url_for('view_listings'))
             except IntegrityError as e:
                 import traceback
                 traceback.print_exc()
                 flash(f"Error: {e.pgerror}", 'error')
                 conn.rollback()
-                conn.close()
                 return redirect(url_for('add_listing'))
 
-    # fetch hosts for dropdown
-    cur.execute('SELECT host_id, host_name FROM Host ORDER BY host_name;')
-    hosts = cur.fetchall()
-    cur.close()
-    conn.close()
+        # fetch hosts for dropdown
+        cur.execute('SELECT host_id, host_name FROM Host ORDER BY host_name;')
+        hosts = cur.fetchall()
 
     return render_template('add_listing.html', hosts=hosts)
 
@@ -457,126 +587,124 @@ def add_listing():
 # Route to update a particular listing.
 @app.route('/update-listing', methods=['GET', 'POST'])
 def update_listing():
-    conn = get_db_connection()
-    cur = conn.cursor()
     if request.method == 'POST':
-        listing_id = request.form.get('listing_id', type=int)
-        # Check existence
-        cur.execute('SELECT 1 FROM Listing WHERE listing_id = %s;', (listing_id,))
-        if not cur.fetchone():
-            flash(f'No such listing exists: {listing_id}', 'error')
-            cur.close()
-            conn.close()
-            return redirect(url_for('update_listing'))
-
-        # Gather all optional fields
-        fields = {
-            'name': request.form.get('name'),
-            'description': request.form.get('description'),
-            'neighbourhood_overview': request.form.get('neighbourhood_overview'),
-            'room_type': request.form.get('room_type'),
-            'accommodates': request.form.get('accommodates', type=int),
-            'bathrooms': request.form.get('bathrooms', type=float),
-            'bedrooms': request.form.get('bedrooms', type=int),
-            'price': request.form.get('price', type=float),
-            'minimum_nights': request.form.get('minimum_nights', type=int)
-        }
-        nbhd = {
-            'name': request.form.get('neighbourhood_name'),
-            'neighbourhood_group': request.form.get('neighbourhood_group'),
-            'latitude': request.form.get('latitude', type=float),
-            'longitude': request.form.get('longitude', type=float)
-        }
+        with connection() as conn, conn.cursor() as cur:
+            listing_id = request.form.get('listing_id', type=int)
+
+            # Gather all optional fields
+            fields = {
+                'name': request.form.get('name'),
+                'description': request.form.get('description'),
+                'neighbourhood_overview': request.form.get('neighbourhood_overview'),
+                'room_type': request.form.get('room_type'),
+                'accommodates': request.form.get('accommodates', type=int),
+                'bathrooms': request.form.get('bathrooms', type=float),
+                'bedrooms': request.form.get('bedrooms', type=int),
+                'price': request.form.get('price', type=float),
+                'minimum_nights': request.form.get('minimum_nights', type=int)
+            }
+            nbhd = {
+                'name': request.form.get('neighbourhood_name'),
+                'neighbourhood_group': request.form.get('neighbourhood_group'),
+                'latitude': request.form.get('latitude', type=float),
+                'longitude': request.form.get('longitude', type=float)
+            }
 
-        # Build SET clauses for Listing table
-        set_clauses = []
-        params = []
-        for col, val in fields.items():
-            if val is not None and val != '':
-                set_clauses.append(f"{col} = %s")
-                params.append(val)
-        if set_clauses:
-            sql = f"UPDATE Listing SET {', '.join(set_clauses)} WHERE listing_id = %s;"
-            params.append(listing_id)
-            cur.execute(sql, params)
-
-        # Build SET clauses for Neighbourhood table
-        set_nb_clauses = []
-        nb_params = []
-        for col, val in nbhd.items():
-            if val is not None and val != '':
-                set_nb_clauses.append(f"{col} = %s")
-                nb_params.append(val)
-        if set_nb_clauses:
-            sql_n = f"UPDATE Neighbourhood SET {', '.join(set_nb_clauses)} WHERE listing_id = %s;"
-            nb_params.append(listing_id)
-            cur.execute(sql_n, nb_params)
-
-            # Update geopoint in listing if coordinates have been changed.
-            if nbhd['latitude'] is not None and nbhd['longitude'] is not None:
-                cur.execute(
-                    """
-                    UPDATE Listing
-                    SET geopoint = ST_SetSRID(
-                                    ST_MakePoint(%s, %s),
-                                    4326
-                                   )::geography
-                     WHERE listing_id = %s;
-                    """,
-                    (
-                        nbhd['longitude'],
-                        nbhd['latitude'],
-                        listing_id
+            # The first UPDATE that runs also tells us whether the listing exists
+            listing_found = None
+
+            # Build SET clauses for Listing table
+            set_clauses = []
+            params = []
+            for col, val in fields.items():
+                if val is not None and val != '':
+                    set_clauses.append(f"{col} = %s")
+                    params.append(val)
+            if set_clauses:
+                sql = f"UPDATE Listing SET {', '.join(set_clauses)} WHERE listing_id = %s;"
+                params.append(listing_id)
+                cur.execute(sql, params)
+                listing_found = cur.rowcount > 0
+
+            # Build SET clauses for Neighbourhood table
+            set_nb_clauses = []
+            nb_params = []
+            for col, val in nbhd.items():
+                if val is not None and val != '':
+                    set_nb_clauses.append(f"{col} = %s")
+                    nb_params.append(val)
+            if set_nb_clauses and listing_found is not False:
+                sql_n = f"UPDATE Neighbourhood SET {', '.join(set_nb_clauses)} WHERE listing_id = %s;"
+                nb_params.append(listing_id)
+                cur.execute(sql_n, nb_params)
+                if listing_found is None:
+                    listing_found = cur.rowcount > 0
+
+                # Update geopoint in listing if coordinates have been changed.
+                if nbhd['latitude'] is not None and nbhd['longitude'] is not None:
+                    cur.execute(
+                        """
+                        UPDATE Listing
+                        SET geopoint = ST_SetSRID(
+                                        ST_MakePoint(%s, %s),
+                                        4326
+                                       )::geography
+                         WHERE listing_id = %s;
+                        """,
+                        (
+                            nbhd['longitude'],
+                            nbhd['latitude'],
+                            listing_id
+                        )
                     )
-                )
 
-        conn.commit()
-        flash(f'Update to listing {listing_id} successful', 'success')
-        cur.close()
-        conn.close()
-        return redirect(url_for('view_listings'))
+            # Nothing to update; just check that the listing exists
+            if listing_found is None:
+                cur.execute('SELECT 1 FROM Listing WHERE listing_id = %s;', (listing_id,))
+                listing_found = cur.fetchone() is not None
+
+            if not listing_found:
+                conn.rollback()
+                flash(f'No such listing exists: {listing_id}', 'error')
+                return redirect(url_for('update_listing'))
+
+            conn.commit()
+            invalidate_filter_options()
+            flash(f'Update to listing {listing_id} successful', 'success')
+            return redirect(url_for('view_listings'))
 
     # GET: render form
-    cur.close()
-    conn.close()
     return render_template('update_listing.html')
 
 # Route to delete a particular listing.
 @app.route('/delete-listing', methods=['GET', 'POST'])
 def delete_listing():
-    conn = get_db_connection()
-    cur = conn.cursor()
-
     if request.method == 'POST':
-        listing_id = request.form.get('listing_id', type=int)
+        with connection() as conn, conn.cursor() as cur:
+            listing_id = request.form.get('listing_id', type=int)
         
-        # attempt to delete
-        cur.execute('SELECT 1 FROM Listing WHERE listing_id = %s;', (listing_id,))
-        if not cur.fetchone():
-            flash(f'Listing ID {listing_id} not found.', 'error')
-        else:
-            cur.execute('DELETE FROM Listing WHERE listing_id = %s;', (listing_id,))
-            conn.commit()
-            flash(f'Listing ID {listing_id} deleted successfully.', 'success')
-        cur.close()
-        conn.close()
-        return redirect(url_for('delete_listing'))
+            # attempt to delete
+            cur.execute('DELETE FROM Listing WHERE listing_id = %s RETURNING listing_id;', (listing_id,))
+            if cur.rowcount == 0:
+                flash(f'Listing ID {listing_id} not found.', 'error')
+            else:
+                conn.commit()
+                invalidate_filter_options()
+                flash(f'Listing ID {listing_id} deleted successfully.', 'success')
+            return redirect(url_for('delete_listing'))
 
     # GET: render form
-    cur.close()
-    conn.close()
     return render_template('delete_listing.html')
 
 # Route to remove the loaded sample data from the database.
 @app.route('/delete-all')
 def delete_all():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM listing;")
-    cur.execute("DELETE FROM host;")
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM listing;")
+        cur.execute("DELETE FROM host;")
+        conn.commit()
+        invalidate_filter_options()
+        invalidate_host_dropdown()
 
     return render_template('delete_all.html')
 
@@ -652,95 +780,84 @@ def get_similarity_weights():
 # Route to view host notifications (`Advanced Feature - Trigger-based)
 @app.route('/notifications')
 def view_notifications():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Get filter parameters
-    host_filter = request.args.get('host_id', type=int)
-    notification_type = request.args.get('notification_type', type=str)
-    status_filter = request.args.get('status', type=str)
-    page = request.args.get('page', default=1, type=int)
-    per_page = 20
-    offset = (page - 1) * per_page
+    with connection() as conn, conn.cursor() as cur:
+        # Get filter parameters
+        host_filter = request.args.get('host_id', type=int)
+        notification_type = request.args.get('notification_type', type=str)
+        status_filter = request.args.get('status', type=str)
+        page = request.args.get('page', default=1, type=int)
+        per_page = 20
+        offset = (page - 1) * per_page
     
-    # Build query with filters
-    base_query = """
-        SELECT 
-            hn.notification_id,
-            h.host_name,
-            hn.notification_type,
-            hn.message,
-            l.name as related_listing_name,
-            l.price as related_listing_price,
-            n.name as neighbourhood,
-            hn.created_at,
-            hn.is_read
-        FROM HostNotifications hn
-        JOIN Host h ON hn.host_id = h.host_id
-        LEFT JOIN Listing l ON hn.related_listing_id = l.listing_id
-        LEFT JOIN Neighbourhood n ON l.listing_id = n.listing_id
-    """
-    count_query = """
-        SELECT COUNT(*)
-        FROM HostNotifications hn
-        JOIN Host h ON hn.host_id = h.host_id
-        LEFT JOIN Listing l ON hn.related_listing_id = l.listing_id
-        LEFT JOIN Neighbourhood n ON l.listing_id = n.listing_id
-    """
-    where_clauses = []
-    params = []
-    count_params = []
-    if host_filter:
-        where_clauses.append("hn.host_id = %s")
-        params.append(host_filter)
-        count_params.append(host_filter)
-    if notification_type:
-        where_clauses.append("hn.notification_type = %s")
-        params.append(notification_type)
-        count_params.append(notification_type)
-    if status_filter:
-        if status_filter == 'read':
-            where_clauses.append("hn.is_read = true")
-            count_params.append(None)
-        elif status_filter == 'unread':
-            where_clauses.append("hn.is_read = false")
-            count_params.append(None)
-    if where_clauses:
-        where_sql = " WHERE " + " AND ".join(where_clauses)
-        base_query += where_sql
-        count_query += where_sql
-    else:
-        where_sql = ""
-    base_query += " ORDER BY hn.created_at DESC LIMIT %s OFFSET %s"
-    params.extend([per_page, offset])
-    cur.execute(count_query, params[:len(params)-2] if len(params) > 2 else params)
-    total_count = cur.fetchone()[0]
-    total_pages = (total_count + per_page - 1) // per_page
-    prev_page = max(1, page - 1)
-    next_page = min(total_pages, page + 1)
-    cur.execute(base_query, params)
-    notifications = cur.fetchall()
-
-    # Get hosts for filter dropdown
-    cur.execute("SELECT host_id, host_name FROM Host ORDER BY host_name")
-    hosts = cur.fetchall()
-    # Format notifications for template
-    formatted_notifications = []
-    for notif in notifications:
-        formatted_notifications.append({
-            'notification_id': notif[0],
-            'host_name': notif[1],
-            'notification_type': notif[2],
-            'message': notif[3],
-            'related_listing_name': notif[4],
-            'related_listing_price': float(notif[5]) if notif[5] else None,
-            'neighbourhood': notif[6],
-            'created_at': notif[7],
-            'is_read': notif[8],
-            'status': 'Read' if notif[8] else 'Unread'
-        })
-    cur.close()
-    conn.close()
+        # Build query with filters
+        base_query = """
+            SELECT 
+                hn.notification_id,
+                h.host_name,
+                hn.notification_type,
+                hn.message,
+                l.name as related_listing_name,
+                l.price as related_listing_price,
+                n.name as neighbourhood,
+                hn.created_at,
+                hn.is_read,
+                COUNT(*) OVER () AS total_count
+            FROM HostNotifications hn
+            JOIN Host h ON hn.host_id = h.host_id
+            LEFT JOIN Listing l ON hn.related_listing_id = l.listing_id
+            LEFT JOIN Neighbourhood n ON l.listing_id = n.listing_id
+        """
+        where_clauses = []
+        params = []
+        if host_filter:
+            where_clauses.append("hn.host_id = %s")
+            params.append(host_filter)
+        if notification_type:
+            where_clauses.append("hn.notification_type = %s")
+            params.append(notification_type)
+        if status_filter:
+            if status_filter == 'read':
+                where_clauses.append("hn.is_read = true")
+            elif status_filter == 'unread':
+                where_clauses.append("hn.is_read = false")
+        where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        base_query += where_sql + " ORDER BY hn.created_at DESC LIMIT %s OFFSET %s"
+        cur.execute(base_query, params + [per_page, offset])
+        notifications = cur.fetchall()
+
+        # Total count comes from the window column of the same scan; a page past
+        # the end has no rows to read it from, so count separately then
+        if notifications:
+            total_count = notifications[0][9]
+        elif page > 1:
+            cur.execute("SELECT COUNT(*) FROM HostNotifications hn JOIN Host h ON hn.host_id = h.host_id"
+                        + where_sql, params)
+            total_count = cur.fetchone()[0]
+        else:
+            total_count = 0
+        total_pages = max(1, (total_count + per_page - 1) // per_page)
+        # Previous from a page past the end goes to the last page that has results
+        prev_page = max(1, min(page - 1, total_pages))
+        next_page = min(total_pages, page + 1)
+
+        # Get hosts for filter dropdown
+        cur.execute("SELECT host_id, host_name FROM Host ORDER BY host_name")
+        hosts = cur.fetchall()
+        # Format notifications for template
+        formatted_notifications = []
+        for notif in notifications:
+            formatted_notifications.append({
+                'notification_id': notif[0],
+                'host_name': notif[1],
+                'notification_type': notif[2],
+                'message': notif[3],
+                'related_listing_name': notif[4],
+                'related_listing_price': notif[5],
+                'neighbourhood': notif[6],
+                'created_at': notif[7],
+                'is_read': notif[8],
+                'status': 'Read' if notif[8] else 'Unread'
+            })
     return render_template('notifications.html', 
         notifications=formatted_notifications,
         hosts=hosts,
@@ -758,62 +875,40 @@ def view_notifications():
 # Route to mark notification as read
 @app.route('/mark-notification-read', methods=['POST'])
 def mark_notification_read():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    notification_id = request.form.get('notification_id', type=int)
+    with connection() as conn, conn.cursor() as cur:
+        notification_id = request.form.get('notification_id', type=int)
     
-    cur.execute("UPDATE HostNotifications SET is_read = true WHERE notification_id = %s", (notification_id,))
-    conn.commit()
-    
-    cur.close()
-    conn.close()
+        execute_prepared(cur, 'mark_notification_read', (notification_id,))
+        conn.commit()
     
     flash('Notification marked as read!', 'success')
     return redirect(url_for('view_notifications'))
 
-# Route to view referral network analysis (Advanced Feature - Recursive Query)
+# Route to view referral network analysis (Advanced Feature - ltree referral paths)
 @app.route('/referral-network')
 def referral_network():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
     # Get filter parameters
     root_host_id = request.args.get('root_host_id', type=int)
     max_depth = 5  # Fixed depth for simplicity
     
-    # Get all hosts in production order (by host_id)
-    cur.execute("SELECT host_id, host_name FROM Host ORDER BY host_id")
-    all_hosts = cur.fetchall()
+    # Get all hosts in production order (by host_id); served from the dropdown
+    # cache, so the page only touches the database when a network is selected
+    all_hosts = _load_host_dropdown()
     
     network_data = []
     network_summary = {}
     
     if root_host_id:
-        # First, get total network revenue for percentage calculations
-        total_revenue_query = """
-        WITH RECURSIVE referral_network AS (
-            SELECT h.host_id, h.host_name, h.referred_by, 0 as network_level
-            FROM Host h WHERE h.host_id = %s
-            UNION ALL
-            SELECT h.host_id, h.host_name, h.referred_by, rn.network_level + 1
-            FROM Host h
-            JOIN referral_network rn ON h.referred_by = rn.host_id
-            WHERE rn.network_level < %s
-        )
-        SELECT COALESCE(SUM(l.price * 30), 0) as total_network_revenue
-        FROM referral_network rn
-        JOIN Host h ON rn.host_id = h.host_id
-        LEFT JOIN Listing l ON h.host_id = l.host_id;
-        """
-        
-        cur.execute(total_revenue_query, (root_host_id, max_depth))
-        total_network_revenue = cur.fetchone()[0]
-        
-        # Recursive query to get referral network with revenue calculations (fixing aggregation)
-        recursive_query = """
-        WITH RECURSIVE referral_network AS (
-            -- Base case: Find the root host
+        # Fetch the referral network in one query; network totals and the summary come
+        # back as window columns on every detail row instead of from separate queries.
+        # The subtree is an index lookup on Host.referral_path (no recursion), and
+        # per-host listing aggregates are precomputed in mv_host_listing_agg.
+        network_query = """
+        WITH root AS (
+            SELECT referral_path FROM Host WHERE host_id = %s
+        ),
+        referral_network AS MATERIALIZED (
+            -- Every host in the root's subtree, down to max_depth levels
             SELECT 
                 h.host_id,
                 h.host_name,
@@ -821,90 +916,79 @@ def referral_network():
                 h.host_since,
                 h.is_superhost,
                 h.host_listings_count,
-                0 as network_level,
-                CAST(h.host_name AS VARCHAR(500)) as referral_path
+                nlevel(h.referral_path) - nlevel(root.referral_path) as network_level,
+                h.referral_path as tree_path
             FROM Host h
-            WHERE h.host_id = %s
-            
-            UNION ALL
-            
-            -- Recursive case: Find all hosts referred by previous level
+            JOIN root ON h.referral_path <@ root.referral_path
+            WHERE nlevel(h.referral_path) - nlevel(root.referral_path) <= %s
+        ),
+        network_rating AS (
+            -- Postgres will not push the network filter into this join on its own
+            SELECT COALESCE(AVG(r.rating), 0) as network_avg_rating
+            FROM Listing l
+            JOIN Review r ON l.listing_id = r.listing_id
+            WHERE l.host_id IN (SELECT host_id FROM referral_network)
+        ),
+        network_rows AS (
             SELECT 
-                h.host_id,
-                h.host_name,
-                h.referred_by,
-                h.host_since,
-                h.is_superhost,
-                h.host_listings_count,
-                rn.network_level + 1,
-                CAST(rn.referral_path || ' -> ' || h.host_name AS VARCHAR(500))
-            FROM Host h
-            JOIN referral_network rn ON h.referred_by = rn.host_id
-            WHERE rn.network_level < %s
+                rn.network_level,
+                rn.host_id,
+                rn.host_name,
+                -- Names from the root down to this host
+                CAST((SELECT string_agg(a.host_name, ' -> ' ORDER BY nlevel(a.referral_path))
+                      FROM Host a
+                      WHERE a.referral_path @> rn.tree_path
+                        AND nlevel(a.referral_path) >= nlevel(rn.tree_path) - rn.network_level)
+                     AS VARCHAR(500)) as referral_path,
+                rn.host_since,
+                rn.is_superhost,
+                rn.host_listings_count,
+                COALESCE(m.avg_price, 0) as avg_listing_price,
+                COALESCE(m.listing_count, 0) as total_listings,
+                COALESCE(m.monthly_rev, 0) as individual_monthly_revenue,
+                rn.tree_path
+            FROM referral_network rn
+            LEFT JOIN mv_host_listing_agg m ON rn.host_id = m.host_id
         )
         SELECT 
-            rn.network_level,
-            rn.host_id,
-            rn.host_name,
-            rn.referral_path,
-            rn.host_since,
-            rn.is_superhost,
-            rn.host_listings_count,
-            COALESCE(AVG(l.price), 0) as avg_listing_price,
-            COUNT(DISTINCT l.listing_id) as total_listings,
-            COALESCE(SUM(l.price * 30), 0) as individual_monthly_revenue,
-            CASE 
-                WHEN %s > 0 THEN ROUND((COALESCE(SUM(l.price * 30), 0) / %s) * 100, 2)
-                ELSE 0 
-            END as revenue_percentage
-        FROM referral_network rn
-        LEFT JOIN Listing l ON rn.host_id = l.host_id
-        GROUP BY rn.network_level, rn.host_id, rn.host_name, rn.referral_path, 
-                 rn.host_since, rn.is_superhost, rn.host_listings_count
-        ORDER BY rn.network_level, rn.host_id;
+            nr.network_level,
+            nr.host_id,
+            nr.host_name,
+            nr.referral_path,
+            nr.host_since,
+            nr.is_superhost,
+            nr.host_listings_count,
+            nr.avg_listing_price,
+            nr.total_listings,
+            nr.individual_monthly_revenue,
+            COALESCE(ROUND(nr.individual_monthly_revenue
+                           / NULLIF(SUM(nr.individual_monthly_revenue) OVER (), 0) * 100, 2), 0) as revenue_percentage,
+            SUM(nr.individual_monthly_revenue) OVER () as total_network_revenue,
+            MAX(nr.network_level) OVER () as max_network_depth,
+            COUNT(*) FILTER (WHERE nr.is_superhost) OVER () as superhost_count,
+            SUM(nr.total_listings) OVER () as total_network_listings,
+            rt.network_avg_rating
+        FROM network_rows nr
+        CROSS JOIN network_rating rt
+        -- Depth-first (pre-order): each host is followed by the hosts it referred
+        ORDER BY nr.tree_path;
         """
         
-        cur.execute(recursive_query, (root_host_id, max_depth, total_network_revenue, total_network_revenue))
-        network_data = cur.fetchall()
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(network_query, (root_host_id, max_depth))
+            network_data = cur.fetchall()
         
-        # Network performance summary
+        # Network performance summary (identical on every row)
         if network_data:
-            summary_query = """
-            WITH RECURSIVE referral_network AS (
-                SELECT h.host_id, h.host_name, h.referred_by, 0 as network_level
-                FROM Host h WHERE h.host_id = %s
-                UNION ALL
-                SELECT h.host_id, h.host_name, h.referred_by, rn.network_level + 1
-                FROM Host h
-                JOIN referral_network rn ON h.referred_by = rn.host_id
-                WHERE rn.network_level < %s
-            )
-            SELECT 
-                COUNT(*) as total_network_hosts,
-                MAX(network_level) as max_network_depth,
-                COALESCE(AVG(r.rating), 0) as network_avg_rating,
-                COUNT(DISTINCT CASE WHEN h.is_superhost THEN h.host_id END) as superhost_count,
-                COUNT(DISTINCT l.listing_id) as total_network_listings
-            FROM referral_network rn
-            JOIN Host h ON rn.host_id = h.host_id
-            LEFT JOIN Listing l ON h.host_id = l.host_id
-            LEFT JOIN Review r ON l.listing_id = r.listing_id;
-            """
-            
-            cur.execute(summary_query, (root_host_id, max_depth))
-            result = cur.fetchone()
-            if result:
-                network_summary = {
-                    'total_agents': len(network_data),
-                    'max_depth': result[1],
-                    'estimated_revenue': total_network_revenue,
-                    'avg_rating': result[2],
-                    'superhosts': result[3],
-                    'total_listings': result[4]
-                }
-    
-    cur.close()
-    conn.close()
+            first = network_data[0]
+            network_summary = {
+                'total_agents': len(network_data),
+                'max_depth': first[12],
+                'estimated_revenue': first[11],
+                'avg_rating': first[15],
+                'superhosts': first[13],
+                'total_listings': first[14]
+            }
     
     return render_template('referral_network.html', 
         network_data=network_data,
@@ -918,39 +1002,33 @@ def referral_network():
 @app.route('/add-host-referral/<int:host_id>', methods=['GET', 'POST'])
 def add_host_referral(host_id=None):
     if request.method == 'POST':
-        host_id = request.form.get('host_id')
-        referred_by = request.form.get('referred_by')
+        # Ids are parsed as integers up front, so malformed values never reach
+        # Postgres and the prepared plan's parameter types always match
+        host_id = request.form.get('host_id', type=int)
+        referred_by = request.form.get('referred_by', type=int)
         is_superhost = bool(request.form.get('is_superhost'))
-        conn = get_db_connection()
-        cur = conn.cursor()
-        try:
-            # Only update existing host
-            cur.execute("""
-                UPDATE Host
-                SET referred_by = %s, is_superhost = %s
-                WHERE host_id = %s
-            """, (referred_by if referred_by else None, is_superhost, host_id))
-            conn.commit()
-            flash('Agent successfully linked to brokerage firm!', 'success')
-            return redirect(url_for('referral_network'))
-        except Exception as e:
-            conn.rollback()
-            flash(f'Error linking agent: {str(e)}', 'error')
-        finally:
-            cur.close()
-            conn.close()
+        if host_id is None or (request.form.get('referred_by') and referred_by is None):
+            flash('Error linking agent: invalid agent id', 'error')
+        else:
+            with connection() as conn, conn.cursor() as cur:
+                try:
+                    # Only update existing host
+                    execute_prepared(cur, 'upd_host_referral', (referred_by, is_superhost, host_id))
+                    conn.commit()
+                    invalidate_host_dropdown()
+                    flash('Agent successfully linked to brokerage firm!', 'success')
+                    return redirect(url_for('referral_network'))
+                except Exception as e:
+                    conn.rollback()
+                    flash(f'Error linking agent: {str(e)}', 'error')
     # GET request - show form
-    # In add_host_referral, fetch up to 500 hosts for dropdowns
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT host_id, host_name FROM Host ORDER BY host_id LIMIT 500")
-    existing_hosts = cur.fetchall()
+    # In add_host_referral, show up to 500 hosts for dropdowns
+    existing_hosts = _load_host_dropdown()[:500]
     current_host = None
-    if host_id:
-        cur.execute("SELECT * FROM Host WHERE host_id = %s", (host_id,))
-        current_host = cur.fetchone()
-    cur.close()
-    conn.close()
+    if host_id is not None:
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT * FROM Host WHERE host_id = %s", (host_id,))
+            current_host = cur.fetchone()
     return render_template('add_host_referral.html', 
         existing_hosts=existing_hosts, 
         current_host=current_host, 
@@ -960,144 +1038,77 @@ def add_host_referral(host_id=None):
 # Route to view detailed information about a specific host and their listings
 @app.route('/host-details/<int:host_id>')
 def host_details(host_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Get host information
-    cur.execute("""
-        SELECT h.host_id, h.host_name, h.host_since, h.host_location, h.host_about,
-               h.host_response_time, h.host_response_rate, h.host_acceptance_rate,
-               h.is_superhost, h.host_listings_count, h.referred_by,
-               r.host_name as referrer_name
-        FROM Host h
-        LEFT JOIN Host r ON h.referred_by = r.host_id
-        WHERE h.host_id = %s
-    """, (host_id,))
-    
-    host_info = cur.fetchone()
-    if not host_info:
-        flash(f'Host with ID {host_id} not found.', 'error')
-        return redirect(url_for('referral_network'))
+    # Rows come back as dicts keyed by column name, ready for the template
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Get host information, plus its position in a referral network if it has a
+        # referrer (its ancestors are the hosts whose referral_path contains its own)
+        cur.execute("""
+            SELECT h.host_id, h.host_name, h.host_since, h.host_location, h.host_about,
+                   h.host_response_time, h.host_response_rate, h.host_acceptance_rate,
+                   h.is_superhost, h.host_listings_count, h.referred_by, h.referrer_name,
+                   nlevel(h.referral_path) - 1 as network_level,
+                   anc.path as network_path
+            FROM Host h
+            LEFT JOIN LATERAL (
+                SELECT string_agg(a.host_name, ' → ' ORDER BY nlevel(a.referral_path)) as path
+                FROM Host a
+                WHERE h.referred_by IS NOT NULL
+                  AND a.referral_path @> h.referral_path
+            ) anc ON true
+            WHERE h.host_id = %s
+        """, (host_id,))
     
-    # Get all listings for this host
-    cur.execute("""
-        SELECT l.listing_id, l.name, l.description, l.room_type, l.accommodates,
-               l.price, l.minimum_nights, l.maximum_nights, l.instant_bookable,
-               l.created_date, l.last_scraped,
-               n.name as neighbourhood_name, n.neighbourhood_group,
-               n.latitude, n.longitude,
-               COALESCE(AVG(r.rating), 0) as avg_rating,
-               COUNT(r.review_id) as review_count,
-               COALESCE(SUM(r.number_of_reviews), 0) as total_reviews
-        FROM Listing l
-        LEFT JOIN Neighbourhood n ON l.listing_id = n.listing_id
-        LEFT JOIN Review r ON l.listing_id = r.listing_id
-        WHERE l.host_id = %s
-        GROUP BY l.listing_id, l.name, l.description, l.room_type, l.accommodates,
-                 l.price, l.minimum_nights, l.maximum_nights, l.instant_bookable,
-                 l.created_date, l.last_scraped, n.name, n.neighbourhood_group,
-                 n.latitude, n.longitude
-        ORDER BY l.created_date DESC
-    """, (host_id,))
+        host_info = cur.fetchone()
+        if not host_info:
+            flash(f'Host with ID {host_id} not found.', 'error')
+            return redirect(url_for('referral_network'))
     
-    listings = cur.fetchall()
+        # Get all listings for this host
+        cur.execute("""
+            SELECT l.listing_id, l.name, l.description, l.room_type, l.accommodates,
+                   l.price, l.minimum_nights, l.maximum_nights, l.instant_bookable,
+                   l.created_date, l.last_scraped,
+                   n.name as neighbourhood_name, n.neighbourhood_group,
+                   n.latitude, n.longitude,
+                   COALESCE(AVG(r.rating), 0) as avg_rating,
+                   COUNT(r.review_id) as review_count,
+                   COALESCE(SUM(r.number_of_reviews), 0) as total_reviews,
+                   -- Host-wide totals, identical on every row
+                   SUM(l.price) OVER () as host_daily_revenue,
+                   COUNT(*) OVER () as host_listing_count,
+                   AVG(COALESCE(AVG(r.rating), 0)) OVER () as host_avg_rating,
+                   SUM(COALESCE(SUM(r.number_of_reviews), 0)) OVER () as host_total_reviews
+            FROM Listing l
+            LEFT JOIN Neighbourhood n ON l.listing_id = n.listing_id
+            LEFT JOIN Review r ON l.listing_id = r.listing_id
+            WHERE l.host_id = %s
+            GROUP BY l.listing_id, l.name, l.description, l.room_type, l.accommodates,
+                     l.price, l.minimum_nights, l.maximum_nights, l.instant_bookable,
+                     l.created_date, l.last_scraped, n.name, n.neighbourhood_group,
+                     n.latitude, n.longitude
+            ORDER BY l.created_date DESC
+        """, (host_id,))
+        listings = cur.fetchall()
     
-    # Get amenities for each listing
-    listing_amenities = {}
+    # Revenue and performance metrics come from the window columns of any row
     if listings:
-        listing_ids = [listing[0] for listing in listings]
-        placeholders = ','.join(['%s'] * len(listing_ids))
-        cur.execute(f"""
-            SELECT listing_id, amenity
-            FROM ListingAmenity
-            WHERE listing_id IN ({placeholders})
-            ORDER BY listing_id, amenity
-        """, listing_ids)
-        
-        amenities_result = cur.fetchall()
-        for listing_id, amenity in amenities_result:
-            if listing_id not in listing_amenities:
-                listing_amenities[listing_id] = []
-            listing_amenities[listing_id].append(amenity)
-    
-    # Calculate revenue and performance metrics
-    total_daily_revenue = sum(float(listing[5]) for listing in listings)
+        totals = listings[0]
+        total_daily_revenue = totals['host_daily_revenue']
+        avg_price = total_daily_revenue / totals['host_listing_count']
+        avg_rating = totals['host_avg_rating']
+        total_reviews = totals['host_total_reviews']
+    else:
+        total_daily_revenue = avg_price = avg_rating = total_reviews = 0
     total_monthly_revenue = total_daily_revenue * 30
-    avg_price = total_daily_revenue / len(listings) if listings else 0
-    avg_rating = sum(float(listing[14]) for listing in listings) / len(listings) if listings else 0
-    total_reviews = sum(int(listing[16]) for listing in listings)
-    
-    # Get network position if this host is part of a network
+
+    # Network position if this host is part of a network
     network_info = None
-    if host_info[10]:  # has referred_by
-        cur.execute("""
-            WITH RECURSIVE referral_network AS (
-                -- Find the root of this host's network
-                SELECT h.host_id, h.host_name, h.referred_by, 0 as level_from_root,
-                       CAST(h.host_name AS VARCHAR(500)) as path_from_root
-                FROM Host h 
-                WHERE h.referred_by IS NULL 
-                  AND h.host_id IN (
-                      -- Find the root by following the chain up
-                      WITH RECURSIVE find_root AS (
-                          SELECT host_id, referred_by FROM Host WHERE host_id = %s
-                          UNION ALL
-                          SELECT h.host_id, h.referred_by 
-                          FROM Host h 
-                          JOIN find_root fr ON h.host_id = fr.referred_by
-                      )
-                      SELECT host_id FROM find_root WHERE referred_by IS NULL
-                  )
-                
-                UNION ALL
-                
-                SELECT h.host_id, h.host_name, h.referred_by, rn.level_from_root + 1,
-                       CAST(rn.path_from_root || ' → ' || h.host_name AS VARCHAR(500))
-                FROM Host h
-                JOIN referral_network rn ON h.referred_by = rn.host_id
-                WHERE rn.level_from_root < 10
-            )
-            SELECT level_from_root, path_from_root
-            FROM referral_network
-            WHERE host_id = %s
-        """, (host_id, host_id))
-        
-        network_result = cur.fetchone()
-        if network_result:
-            network_info = {
-                'level': network_result[0],
-                'path': network_result[1]
-            }
-    
-    cur.close()
-    conn.close()
-    
-    # Format host data for template
-    host_data = {
-        'host_id': host_info[0],
-        'host_name': host_info[1],
-        'host_since': host_info[2],
-        'host_location': host_info[3],
-        'host_about': host_info[4],
-        'host_response_time': host_info[5],
-        'host_response_rate': host_info[6],
-        'host_acceptance_rate': host_info[7],
-        'is_superhost': host_info[8],
-        'host_listings_count': host_info[9],
-        'referred_by': host_info[10],
-        'referrer_name': host_info[11]
-    }
-    
-    # Format listings data for template (simplified for the new table structure)
-    listings_data = []
-    for listing in listings:
-        listings_data.append({
-            'name': listing[1],
-            'room_type': listing[3],
-            'accommodates': listing[4],
-            'price': float(listing[5])
-        })
-    
+    if host_info['referred_by']:
+        network_info = {
+            'level': host_info['network_level'],
+            'path': host_info['network_path']
+        }
+
     performance_metrics = {
         'total_daily_revenue': total_daily_revenue,
         'total_monthly_revenue': total_monthly_revenue,
@@ -1108,12 +1119,20 @@ def host_details(host_id):
     }
     
     return render_template('host_details.html',
-        host=host_data,
-        listings=listings_data,
+        host=host_info,
+        listings=listings,
         performance=performance_metrics,
         network_info=network_info
     )
 
+# One-shot database setup for deploy entrypoints: `flask --app app init-db`.
+# Safe to run from several processes at once; only one does the work.
+@app.cli.command('init-db')
+def init_db_command():
+    from init_render_db import initialize_database
+    if not initialize_database():
+        raise SystemExit(1)
+
 if __name__ == '__main__':
     # Ensure the schema is created before handling requests
     init_db()
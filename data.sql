@@ -7,6 +7,8 @@ DROP TABLE IF EXISTS Neighbourhood       CASCADE;
 DROP TABLE IF EXISTS Host               CASCADE;
 
 CREATE EXTENSION IF NOT EXISTS PostGIS;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS ltree;
 
 -- HOST (strong entity)
 CREATE TABLE Host (
@@ -20,7 +22,11 @@ CREATE TABLE Host (
   host_acceptance_rate INTEGER    CHECK (host_acceptance_rate >= 0 AND host_acceptance_rate <= 100),
   is_superhost       BOOLEAN,
   host_listings_count INTEGER      CHECK (host_listings_count >= 0),
-  referred_by        INTEGER       REFERENCES Host(host_id)
+  referred_by        INTEGER       REFERENCES Host(host_id),
+  referral_path      ltree,
+  -- host ids from the root of the referral network down to this host (e.g. 1.2.4), maintained by trigger
+  referrer_name      VARCHAR(255)
+  -- copy of the referrer's host_name so host pages do not need a self-join, maintained by trigger
 );
 
 -- LISTING (strong entity)
@@ -44,13 +50,16 @@ CREATE TABLE Listing (
   last_scraped      DATE,
   geopoint          geography(Point, 4326),
   -- 4326 indicates to PostGIS that the data should be treated as coordinates on WGS 84 which is the standard for specifying locations in terms of latitude and longitude. 
+  lat               DOUBLE PRECISION GENERATED ALWAYS AS (ST_Y(geopoint::geometry)) STORED,
+  lng               DOUBLE PRECISION GENERATED ALWAYS AS (ST_X(geopoint::geometry)) STORED,
+  -- lat/lng are extracted once when geopoint is written so reads never have to cast and decode the geography.
 
   FOREIGN KEY (host_id) REFERENCES Host(host_id) ON DELETE CASCADE
 );
 
 -- NEIGHBOURHOOD (weak entity)
 CREATE TABLE Neighbourhood (
-  neighbourhood_id  INTEGER      PRIMARY KEY,
+  neighbourhood_id  SERIAL       PRIMARY KEY,
   listing_id        INTEGER      NOT NULL,
   name              VARCHAR(255),
   neighbourhood_group VARCHAR(255),
@@ -126,6 +135,11 @@ CREATE INDEX idx_host_listings_count ON Host(host_listings_count);
 CREATE INDEX idx_listing_geopoint ON Listing USING GIST (geopoint);
 -- GiST spatial index is created on geopoint column instead of traditional B-tree since B-tree indexes cannot index spatial data but GiST indexes support PostGIS geography type and allows us to perform distance/spatial searches.
 
+-- Indexes added after the first release (minimum_nights, the trigram search indexes,
+-- Listing host_id and the Host referral indexes) are defined once in _MIGRATION_INDEXES
+-- in app.py, and the Host referral triggers in migrations.sql; init_db() runs both
+-- after this script.
+
 -- TRIGGER FUNCTION: Notify neighborhood hosts when new listing is added
 CREATE OR REPLACE FUNCTION notify_neighborhood_hosts()
 RETURNS TRIGGER AS $$
@@ -166,28 +180,18 @@ CREATE TRIGGER new_listing_notification
 -- Index on Neighbourhood name for fast neighborhood lookups in trigger
 CREATE INDEX idx_neighbourhood_name ON Neighbourhood(name);
 
--- Index on Listing host_id for fast host-based filtering in trigger
-CREATE INDEX idx_listing_host_id ON Listing(host_id);
-
 -- Index on HostNotifications for efficient notification queries
 CREATE INDEX idx_hostnotifications_host_id ON HostNotifications(host_id);
 CREATE INDEX idx_hostnotifications_created_at ON HostNotifications(created_at);
 CREATE INDEX idx_hostnotifications_type ON HostNotifications(notification_type);
 
--- Indexes for Feature 2: Recursive Brokerage Firm Network Analysis
--- These indexes optimize the recursive CTE queries that traverse referral relationships
-
--- Index on Host referred_by for fast recursive traversal
-CREATE INDEX idx_host_referred_by ON Host(referred_by);
+-- Indexes for Feature 2: Brokerage Firm Network Analysis
+-- Each host's referral chain is stored as an ltree path (Host.referral_path) kept current
+-- by the triggers in migrations.sql, so networks are read with GiST path lookups
+-- (idx_host_referral_path, see _MIGRATION_INDEXES in app.py) instead of recursion
 
--- Index on Host host_id for fast lookups in recursive queries
+-- Index on Host host_id for fast host lookups
 CREATE INDEX idx_host_host_id ON Host(host_id);
 
--- Composite index on Host for referral network queries
-CREATE INDEX idx_host_referral_network ON Host(referred_by, host_id, host_name);
-
 -- Index on Listing price for fast revenue calculations
 CREATE INDEX idx_listing_price ON Listing(price);
-
--- Index on Listing host_id for fast host-listing joins
-CREATE INDEX idx_listing_host_id_price ON Listing(host_id, price);
\ No newline at end of file
@@ -1,7 +1,7 @@
 import pandas as pd
-import psycopg2
 from psycopg2 import errors, IntegrityError
-from db_config import DB_CONFIG
+from psycopg2.extras import execute_values
+from db_config import connection
 import re
 from datetime import datetime
 import logging
@@ -10,11 +10,8 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_db_connection():
-    """
-    Get database connection
-    """
-    return psycopg2.connect(**DB_CONFIG)
+# Rows sent per multi-row INSERT by execute_values
+BATCH_SIZE = 1000
 
 def parse_price(price_str):
     """
@@ -83,21 +80,16 @@ def is_database_empty():
     Check if database is empty (no hosts or listings)
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Check if Host table has any records
-        cur.execute("SELECT COUNT(*) FROM Host;")
-        host_count = cur.fetchone()[0]
-        
-        # Check if Listing table has any records
-        cur.execute("SELECT COUNT(*) FROM Listing;")
-        listing_count = cur.fetchone()[0]
+        with connection() as conn, conn.cursor() as cur:
+            # Check if Host table has any records
+            cur.execute("SELECT COUNT(*) FROM Host;")
+            host_count = cur.fetchone()[0]
         
-        cur.close()
-        conn.close()
+            # Check if Listing table has any records
+            cur.execute("SELECT COUNT(*) FROM Listing;")
+            listing_count = cur.fetchone()[0]
         
-        return host_count == 0 and listing_count == 0
+            return host_count == 0 and listing_count == 0
         
     except Exception as e:
         logger.error(f"Error checking database status: {e}")
@@ -125,6 +117,7 @@ def load_hosts_from_csv(csv_file_path, conn):
         logger.info(f"Found {len(hosts_df)} unique hosts")
         
         cur = conn.cursor()
+        host_rows = []
         
         for _, row in hosts_df.iterrows():
             try:
@@ -148,21 +141,23 @@ def load_hosts_from_csv(csv_file_path, conn):
                 if host_listings_count < 0:
                     host_listings_count = 0
                 
-                # Insert into database
-                cur.execute("""
-                    INSERT INTO Host (host_id, host_name, host_since, host_location, host_about,
-                                    host_response_time, host_response_rate, host_acceptance_rate,
-                                    is_superhost, host_listings_count)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (host_id) DO NOTHING
-                """, (host_id, host_name, host_since, host_location, host_about,
-                     host_response_time, host_response_rate, host_acceptance_rate,
-                     is_superhost, host_listings_count))
+                host_rows.append((host_id, host_name, host_since, host_location, host_about,
+                                  host_response_time, host_response_rate, host_acceptance_rate,
+                                  is_superhost, host_listings_count))
                 
             except Exception as e:
-                logger.warning(f"Error inserting host {row.get('host_id', 'unknown')}: {e}")
+                logger.warning(f"Error parsing host {row.get('host_id', 'unknown')}: {e}")
                 continue
         
+        # Insert into database in batches
+        execute_values(cur, """
+            INSERT INTO Host (host_id, host_name, host_since, host_location, host_about,
+                            host_response_time, host_response_rate, host_acceptance_rate,
+                            is_superhost, host_listings_count)
+            VALUES %s
+            ON CONFLICT (host_id) DO NOTHING
+        """, host_rows, page_size=BATCH_SIZE)
+        
         conn.commit()
         logger.info("Hosts loaded successfully")
         
@@ -186,6 +181,11 @@ def load_listings_from_csv(csv_file_path, conn):
         logger.info(f"Processing {len(df)} listings")
         
         cur = conn.cursor()
+        listing_rows = []
+        neighbourhood_rows = []
+        amenity_rows = []
+        review_rows = []
+        availability_rows = []
         
         for _, row in df.iterrows():
             try:
@@ -230,46 +230,22 @@ def load_listings_from_csv(csv_file_path, conn):
                 if longitude is not None and (longitude < -180 or longitude > 180):
                     longitude = None
                 
-                # Insert listing
-                cur.execute("""
-                    INSERT INTO Listing (listing_id, host_id, name, description, neighbourhood_overview,
-                                       room_type, accommodates, bathrooms, bathrooms_text, bedrooms, beds,
-                                       price, minimum_nights, maximum_nights, instant_bookable,
-                                       created_date, last_scraped, geopoint)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                    ST_SetSRID(
-                    ST_MakePoint(%s, %s), 4326
-                    )::geography
-                    )
-                    ON CONFLICT (listing_id) DO NOTHING
-                """, (listing_id, host_id, name, description, neighbourhood_overview,
-                     room_type, accommodates, bathrooms, bathrooms_text, bedrooms, beds,
-                     price, minimum_nights, maximum_nights, instant_bookable,
-                     datetime.now().date(), last_scraped, longitude, latitude))
-                
-                # Get next neighbourhood_id
-                cur.execute("SELECT COALESCE(MAX(neighbourhood_id), 0) + 1 FROM Neighbourhood")
-                neighbourhood_id = cur.fetchone()[0]
+                listing_rows.append((listing_id, host_id, name, description, neighbourhood_overview,
+                                     room_type, accommodates, bathrooms, bathrooms_text, bedrooms, beds,
+                                     price, minimum_nights, maximum_nights, instant_bookable,
+                                     datetime.now().date(), last_scraped, longitude, latitude))
                 
-                # Insert neighbourhood
-                cur.execute("""
-                    INSERT INTO Neighbourhood (neighbourhood_id, listing_id, name, neighbourhood_group, latitude, longitude)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT DO NOTHING
-                """, (neighbourhood_id, listing_id, neighbourhood_name, neighbourhood_group,
-                     latitude, longitude))
+                # Neighbourhood (neighbourhood_id comes from its sequence)
+                neighbourhood_rows.append((listing_id, neighbourhood_name, neighbourhood_group,
+                                           latitude, longitude))
                 
-                # Insert amenities
+                # Amenities
                 amenities = parse_amenities(row['amenities'])
                 for amenity in amenities:
                     if amenity:  # Skip empty amenities
-                        cur.execute("""
-                            INSERT INTO ListingAmenity (listing_id, amenity)
-                            VALUES (%s, %s)
-                            ON CONFLICT DO NOTHING
-                        """, (listing_id, amenity))
+                        amenity_rows.append((listing_id, amenity))
                 
-                # Insert review summary (if review data exists)
+                # Review summary (if review data exists)
                 if pd.notna(row['review_scores_rating']) and row['review_scores_rating'] > 0:
                     review_date = parse_date(row['last_review'])
                     if review_date is None:
@@ -284,25 +260,53 @@ def load_listings_from_csv(csv_file_path, conn):
                     if rating < 1 or rating > 5:
                         rating = max(1, min(5, rating))
                     
-                    cur.execute("""
-                        INSERT INTO Review (listing_id, review_date, rating, accuracy, location, number_of_reviews)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (listing_id, review_date, rating, accuracy, location, number_of_reviews))
+                    review_rows.append((listing_id, review_date, rating, accuracy, location, number_of_reviews))
                 
-                # Insert availability data
+                # Availability data
                 availability_30 = int(row['availability_30']) if pd.notna(row['availability_30']) else None
                 availability_365 = int(row['availability_365']) if pd.notna(row['availability_365']) else None
                 
                 if availability_30 is not None or availability_365 is not None:
-                    cur.execute("""
-                        INSERT INTO Availability (listing_id, date, availability_30, availability_365)
-                        VALUES (%s, %s, %s, %s)
-                    """, (listing_id, datetime.now().date(), availability_30, availability_365))
+                    availability_rows.append((listing_id, datetime.now().date(), availability_30, availability_365))
                 
             except Exception as e:
-                logger.warning(f"Error inserting listing {row.get('id', 'unknown')}: {e}")
+                logger.warning(f"Error parsing listing {row.get('id', 'unknown')}: {e}")
                 continue
         
+        # Insert everything in batches, parents before children
+        execute_values(cur, """
+            INSERT INTO Listing (listing_id, host_id, name, description, neighbourhood_overview,
+                               room_type, accommodates, bathrooms, bathrooms_text, bedrooms, beds,
+                               price, minimum_nights, maximum_nights, instant_bookable,
+                               created_date, last_scraped, geopoint)
+            VALUES %s
+            ON CONFLICT (listing_id) DO NOTHING
+        """, listing_rows, page_size=BATCH_SIZE,
+            template="""(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                       ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography)""")
+        
+        execute_values(cur, """
+            INSERT INTO Neighbourhood (listing_id, name, neighbourhood_group, latitude, longitude)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+        """, neighbourhood_rows, page_size=BATCH_SIZE)
+        
+        execute_values(cur, """
+            INSERT INTO ListingAmenity (listing_id, amenity)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+        """, amenity_rows, page_size=BATCH_SIZE)
+        
+        execute_values(cur, """
+            INSERT INTO Review (listing_id, review_date, rating, accuracy, location, number_of_reviews)
+            VALUES %s
+        """, review_rows, page_size=BATCH_SIZE)
+        
+        execute_values(cur, """
+            INSERT INTO Availability (listing_id, date, availability_30, availability_365)
+            VALUES %s
+        """, availability_rows, page_size=BATCH_SIZE)
+        
         conn.commit()
         logger.info("Listings loaded successfully")
         
@@ -327,6 +331,11 @@ def load_reviews_from_csv(csv_file_path, conn):
         
         cur = conn.cursor()
         
+        # Fetch existing listing ids once instead of checking each review
+        cur.execute("SELECT listing_id FROM Listing")
+        existing_listings = {r[0] for r in cur.fetchall()}
+        review_rows = []
+        
         for _, row in df.iterrows():
             try:
                 listing_id = int(row['listing_id'])
@@ -335,21 +344,21 @@ def load_reviews_from_csv(csv_file_path, conn):
                 if review_date is None:
                     continue
                 
-                # Check if listing exists
-                cur.execute("SELECT 1 FROM Listing WHERE listing_id = %s", (listing_id,))
-                if not cur.fetchone():
+                if listing_id not in existing_listings:
                     continue
                 
                 # Create a basic review with default rating
-                cur.execute("""
-                    INSERT INTO Review (listing_id, review_date, rating, accuracy, location, number_of_reviews)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (listing_id, review_date, 4.0, 8.0, 8.0, 1))
+                review_rows.append((listing_id, review_date, 4.0, 8.0, 8.0, 1))
                 
             except Exception as e:
-                logger.warning(f"Error inserting review for listing {row.get('listing_id', 'unknown')}: {e}")
+                logger.warning(f"Error parsing review for listing {row.get('listing_id', 'unknown')}: {e}")
                 continue
         
+        execute_values(cur, """
+            INSERT INTO Review (listing_id, review_date, rating, accuracy, location, number_of_reviews)
+            VALUES %s
+        """, review_rows, page_size=BATCH_SIZE)
+        
         conn.commit()
         logger.info("Reviews loaded successfully")
         
@@ -368,20 +377,18 @@ def load_production_data_if_needed():
     logger.info("Database is empty, loading production data...")
     
     try:
-        conn = get_db_connection()
-        
-        # Load data in correct order due to foreign key constraints
-        load_hosts_from_csv('prod_data/listings.csv', conn)
-        load_listings_from_csv('prod_data/listings.csv', conn)
+        with connection() as conn:
+            # Load data in correct order due to foreign key constraints
+            load_hosts_from_csv('prod_data/listings.csv', conn)
+            load_listings_from_csv('prod_data/listings.csv', conn)
         
-        # Load reviews if file exists
-        try:
-            load_reviews_from_csv('prod_data/reviews.csv', conn)
-        except FileNotFoundError:
-            logger.warning("reviews.csv not found, skipping reviews data")
+            # Load reviews if file exists
+            try:
+                load_reviews_from_csv('prod_data/reviews.csv', conn)
+            except FileNotFoundError:
+                logger.warning("reviews.csv not found, skipping reviews data")
         
-        conn.close()
-        logger.info("Production data loaded successfully!")
+            logger.info("Production data loaded successfully!")
         
     except Exception as e:
         logger.error(f"Error loading production data: {e}")
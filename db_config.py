@@ -1,4 +1,7 @@
+import atexit
 import os
+from contextlib import contextmanager
+from psycopg2 import extensions, pool
 
 # Use environment variable for production, fallback to local config for development
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -24,3 +27,38 @@ else:
         "host": "localhost",
         "port": 5432
     }
+
+# Route connections through PgBouncer (transaction pooling) when one is deployed
+# alongside the database. See DEPLOYMENT.md for the matching pgbouncer.ini.
+PGBOUNCER_HOST = os.environ.get('PGBOUNCER_HOST')
+if PGBOUNCER_HOST:
+    DB_CONFIG["host"] = PGBOUNCER_HOST
+    DB_CONFIG["port"] = int(os.environ.get('PGBOUNCER_PORT', 6432))
+
+# SQL-level PREPARE is session state, which PgBouncer's transaction pooling does
+# not preserve, so server-side prepared statements are only used on direct connections.
+USE_SERVER_PREPARE = not PGBOUNCER_HOST
+
+# Pooled connection that remembers which prepared statements its session holds.
+class PreparingConnection(extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+# Connection pool shared by every module in this worker (routes, analytics,
+# recommendations, data loading), so no code path pays the connect/auth
+# handshake per request.
+POOL = pool.ThreadedConnectionPool(
+    minconn=5, maxconn=25, connection_factory=PreparingConnection, **DB_CONFIG
+)
+atexit.register(POOL.closeall)
+
+# Borrows a pooled connection for a `with` block and always returns it, even if
+# the block raises (any open transaction is rolled back by the pool).
+@contextmanager
+def connection():
+    conn = POOL.getconn()
+    try:
+        yield conn
+    finally:
+        POOL.putconn(conn)
@@ -6,35 +6,56 @@ This runs once during the build process.
 
 import os
 import sys
-from app import init_db, get_db_connection
+from app import init_db, migrate_db
+from db_config import connection
 from data_ingestion import load_production_data_if_needed
 from analytics import init_analytics_views
 
+# Advisory lock key shared by every process that may try to initialize the database
+INIT_LOCK_KEY = 348
+
 def check_if_initialized():
     """Check if database is already initialized"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'listing'
-            );
-        """)
-        table_exists = cur.fetchone()[0]
-        cur.close()
-        conn.close()
-        return table_exists
+        with connection() as conn, conn.cursor() as cur:
+            # to_regclass is a single pg_class lookup, unlike the information_schema views
+            cur.execute("SELECT to_regclass('public.listing') IS NOT NULL")
+            return cur.fetchone()[0]
     except Exception as e:
         print(f"Error checking database: {e}")
         return False
 
+def check_analytics_views():
+    """Check if the materialized views the routes read from exist"""
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT to_regclass('public.mv_listing_stats') IS NOT NULL
+               AND to_regclass('public.mv_host_listing_agg') IS NOT NULL
+        """)
+        return cur.fetchone()[0]
+
 def initialize_database():
+    """Initialize the database, waiting for any other process that is already doing it"""
+    with connection() as conn, conn.cursor() as cur:
+        # Blocks until a concurrent run finishes; _initialize_database() then
+        # re-checks, so this process only reports success once the schema exists
+        cur.execute("SELECT pg_advisory_lock(%s)", (INIT_LOCK_KEY,))
+        try:
+            return _initialize_database()
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (INIT_LOCK_KEY,))
+
+def _initialize_database():
     """Initialize database schema, data, and analytics"""
     try:
         if check_if_initialized():
-            print("✓ Database already initialized. Skipping.")
+            print("✓ Database already initialized. Applying migrations...")
+            migrate_db()
+            if not check_analytics_views():
+                print("Initializing analytics views...")
+                init_analytics_views()
+                print("✓ Analytics views created!")
+            print("✓ Database schema up to date.")
             return True
         
         print("Initializing database schema...")
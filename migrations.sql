@@ -0,0 +1,128 @@
+-- Schema added on top of data.sql's tables: new columns and sequences for databases
+-- created from an older data.sql, plus the Host referral triggers. Every statement is
+-- idempotent; migrate_db() in app.py runs this file after data.sql on a fresh database
+-- and on each deploy of an existing one, then builds the indexes in _MIGRATION_INDEXES.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS ltree;
+
+-- NEIGHBOURHOOD: neighbourhood_id is assigned by a sequence (SERIAL), starting after the existing rows
+DO $$
+BEGIN
+    IF pg_get_serial_sequence('neighbourhood', 'neighbourhood_id') IS NULL THEN
+        CREATE SEQUENCE IF NOT EXISTS neighbourhood_neighbourhood_id_seq
+            OWNED BY Neighbourhood.neighbourhood_id;
+        ALTER TABLE Neighbourhood
+            ALTER COLUMN neighbourhood_id SET DEFAULT nextval('neighbourhood_neighbourhood_id_seq');
+        PERFORM setval('neighbourhood_neighbourhood_id_seq',
+                       COALESCE(MAX(neighbourhood_id), 0) + 1, false)
+        FROM Neighbourhood;
+    END IF;
+END;
+$$;
+
+-- LISTING: lat/lng extracted from geopoint
+ALTER TABLE Listing
+  ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION GENERATED ALWAYS AS (ST_Y(geopoint::geometry)) STORED,
+  ADD COLUMN IF NOT EXISTS lng DOUBLE PRECISION GENERATED ALWAYS AS (ST_X(geopoint::geometry)) STORED;
+
+-- HOST: materialized referral chain and referrer name
+ALTER TABLE Host
+  ADD COLUMN IF NOT EXISTS referral_path ltree,
+  ADD COLUMN IF NOT EXISTS referrer_name VARCHAR(255);
+
+-- TRIGGER FUNCTION: Derive a host's referral_path and referrer_name from its referrer
+CREATE OR REPLACE FUNCTION set_host_referral_fields()
+RETURNS TRIGGER AS $$
+DECLARE
+    parent_path ltree;
+BEGIN
+    SELECT referral_path, host_name INTO parent_path, NEW.referrer_name
+    FROM Host WHERE host_id = NEW.referred_by;
+    -- A host cannot be referred by itself or by anyone in its own subtree
+    IF NEW.referred_by = NEW.host_id
+       OR (TG_OP = 'UPDATE' AND parent_path <@ OLD.referral_path) THEN
+        RAISE EXCEPTION 'Host % cannot be referred by host %: that would create a referral cycle',
+            NEW.host_id, NEW.referred_by;
+    END IF;
+    NEW.referral_path := COALESCE(parent_path, ''::ltree) || NEW.host_id::text;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS host_referral_fields ON Host;
+CREATE TRIGGER host_referral_fields
+    BEFORE INSERT OR UPDATE OF referred_by ON Host
+    FOR EACH ROW
+    EXECUTE FUNCTION set_host_referral_fields();
+
+-- TRIGGER FUNCTION: Keep referrer_name current on referred hosts when a host is renamed
+CREATE OR REPLACE FUNCTION rename_host_referrer()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Skip the UPDATE when nobody was referred, so it does not fire the
+    -- statement-level analytics refresh on Host a second time
+    IF EXISTS (SELECT 1 FROM Host WHERE referred_by = NEW.host_id) THEN
+        UPDATE Host SET referrer_name = NEW.host_name
+        WHERE referred_by = NEW.host_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS host_referrer_rename ON Host;
+CREATE TRIGGER host_referrer_rename
+    AFTER UPDATE OF host_name ON Host
+    FOR EACH ROW
+    WHEN (OLD.host_name IS DISTINCT FROM NEW.host_name)
+    EXECUTE FUNCTION rename_host_referrer();
+
+-- TRIGGER FUNCTION: Move the rest of the subtree along when a host changes referrer
+CREATE OR REPLACE FUNCTION move_host_referral_subtree()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Skip the UPDATE for a host with no subtree, so it does not fire the
+    -- statement-level analytics refresh on Host a second time
+    IF EXISTS (SELECT 1 FROM Host WHERE referral_path <@ OLD.referral_path
+                                    AND host_id <> NEW.host_id) THEN
+        UPDATE Host
+        SET referral_path = NEW.referral_path || subpath(referral_path, nlevel(OLD.referral_path))
+        WHERE referral_path <@ OLD.referral_path
+          AND host_id <> NEW.host_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS host_referral_subtree ON Host;
+CREATE TRIGGER host_referral_subtree
+    AFTER UPDATE OF referred_by ON Host
+    FOR EACH ROW
+    WHEN (OLD.referral_path IS DISTINCT FROM NEW.referral_path)
+    EXECUTE FUNCTION move_host_referral_subtree();
+
+-- Backfill referral_path/referrer_name for hosts written before the triggers existed,
+-- walking each referred_by chain down from its root. The UPDATE does not touch
+-- referred_by or host_name, so none of the triggers above fire for it.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM Host WHERE referral_path IS NULL) THEN
+        WITH RECURSIVE chain AS (
+            SELECT host_id, host_name, text2ltree(host_id::text) AS path,
+                   NULL::VARCHAR(255) AS referrer_name
+            FROM Host
+            WHERE referred_by IS NULL
+            UNION ALL
+            SELECT h.host_id, h.host_name, c.path || h.host_id::text, c.host_name
+            FROM Host h
+            JOIN chain c ON h.referred_by = c.host_id
+        )
+        UPDATE Host h
+        SET referral_path = c.path,
+            referrer_name = c.referrer_name
+        FROM chain c
+        WHERE h.host_id = c.host_id
+          AND h.referral_path IS DISTINCT FROM c.path;
+    END IF;
+END;
+$$;
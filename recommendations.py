@@ -1,13 +1,8 @@
 import logging
 from typing import List, Dict, Optional, Tuple
-from db_config import DB_CONFIG
-import psycopg2
+from db_config import connection
 import math
 
-def get_db_connection():
-    conn = psycopg2.connect(**DB_CONFIG)
-    return conn
-
 class RecommendationEngine:
     """
     Modular recommendation engine using recursive SQL and similarity scoring
@@ -27,44 +22,39 @@ class RecommendationEngine:
         Get recommendations for a listing using recursive similarity analysis
         """
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # First, get the base listing details
-            base_listing = self._get_listing_details(cursor, listing_id)
-            if not base_listing:
-                return []
-            
-            # Execute recursive recommendation query
-            recommendations = self._execute_recursive_recommendation_query(
-                cursor, listing_id, max_results, similarity_threshold
-            )
-            
-            print(f"Found {len(recommendations)} potential recommendations")
-            
-            # Calculate detailed similarity scores
-            scored_recommendations = []
-            for rec in recommendations:
-                if rec['listing_id'] != listing_id:  # Don't recommend the same listing
-                    try:
-                        score_details = self._calculate_detailed_similarity(
-                            cursor, base_listing, rec
-                        )
-                        rec.update(score_details)
-                        scored_recommendations.append(rec)
-                    except Exception as e:
-                        import traceback
-                        print(f"Error calculating similarity for listing {rec['listing_id']}: {e}")
-                        print(f"Traceback: {traceback.format_exc()}")
-                        continue
-            
-            # Sort by similarity score
-            scored_recommendations.sort(key=lambda x: x['similarity_score'], reverse=True)
-            
-            cursor.close()
-            conn.close()
-            
-            return scored_recommendations[:max_results]
+            with connection() as conn, conn.cursor() as cursor:
+                # First, get the base listing details
+                base_listing = self._get_listing_details(cursor, listing_id)
+                if not base_listing:
+                    return []
+            
+                # Execute recursive recommendation query
+                recommendations = self._execute_recursive_recommendation_query(
+                    cursor, listing_id, max_results, similarity_threshold
+                )
+            
+                print(f"Found {len(recommendations)} potential recommendations")
+            
+                # Calculate detailed similarity scores
+                scored_recommendations = []
+                for rec in recommendations:
+                    if rec['listing_id'] != listing_id:  # Don't recommend the same listing
+                        try:
+                            score_details = self._calculate_detailed_similarity(
+                                cursor, base_listing, rec
+                            )
+                            rec.update(score_details)
+                            scored_recommendations.append(rec)
+                        except Exception as e:
+                            import traceback
+                            print(f"Error calculating similarity for listing {rec['listing_id']}: {e}")
+                            print(f"Traceback: {traceback.format_exc()}")
+                            continue
+            
+                # Sort by similarity score
+                scored_recommendations.sort(key=lambda x: x['similarity_score'], reverse=True)
+            
+                return scored_recommendations[:max_results]
             
         except Exception as e:
             import traceback
@@ -388,15 +378,10 @@ class RecommendationEngine:
         Get detailed listing information for comparison display
         """
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            listing = self._get_listing_details(cursor, listing_id)
+            with connection() as conn, conn.cursor() as cursor:
+                listing = self._get_listing_details(cursor, listing_id)
             
-            cursor.close()
-            conn.close()
-            
-            return listing
+                return listing
             
         except Exception as e:
             logging.error(f"Error getting listing details: {e}")
@@ -407,35 +392,30 @@ class RecommendationEngine:
         Search listings by name or description
         """
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            search_query = """
-                SELECT 
-                    l.listing_id, l.name, l.price, l.room_type, 
-                    l.accommodates, n.name as neighbourhood_name,
-                    COALESCE(AVG(r.rating), 0) as avg_rating,
-                    COUNT(r.review_id) as review_count
-                FROM listing l
-                LEFT JOIN neighbourhood n ON l.listing_id = n.listing_id
-                LEFT JOIN review r ON l.listing_id = r.listing_id
-                WHERE l.name ILIKE %s OR l.description ILIKE %s
-                GROUP BY l.listing_id, n.neighbourhood_id
-                ORDER BY l.name
-                LIMIT %s
-            """
-            
-            search_term = f"%{query}%"
-            cursor.execute(search_query, (search_term, search_term, limit))
-            results = cursor.fetchall()
-            
-            columns = [desc[0] for desc in cursor.description]
-            listings = [dict(zip(columns, row)) for row in results]
-            
-            cursor.close()
-            conn.close()
-            
-            return listings
+            with connection() as conn, conn.cursor() as cursor:
+                search_query = """
+                    SELECT 
+                        l.listing_id, l.name, l.price, l.room_type, 
+                        l.accommodates, n.name as neighbourhood_name,
+                        COALESCE(AVG(r.rating), 0) as avg_rating,
+                        COUNT(r.review_id) as review_count
+                    FROM listing l
+                    LEFT JOIN neighbourhood n ON l.listing_id = n.listing_id
+                    LEFT JOIN review r ON l.listing_id = r.listing_id
+                    WHERE l.name ILIKE %s OR l.description ILIKE %s
+                    GROUP BY l.listing_id, n.neighbourhood_id
+                    ORDER BY l.name
+                    LIMIT %s
+                """
+            
+                search_term = f"%{query}%"
+                cursor.execute(search_query, (search_term, search_term, limit))
+                results = cursor.fetchall()
+            
+                columns = [desc[0] for desc in cursor.description]
+                listings = [dict(zip(columns, row)) for row in results]
+            
+                return listings
             
         except Exception as e:
             logging.error(f"Error searching listings: {e}")
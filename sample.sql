@@ -137,6 +137,9 @@ INSERT INTO Neighbourhood (neighbourhood_id, listing_id, name, neighbourhood_gro
 (14, 114, 'Mission District', 'San Francisco', 37.7599, -122.4148),
 (15, 115, 'Mission District', 'San Francisco', 37.7599, -122.4148);
 
+-- Keep the neighbourhood_id sequence ahead of the explicit ids above
+SELECT setval(pg_get_serial_sequence('neighbourhood', 'neighbourhood_id'), (SELECT MAX(neighbourhood_id) FROM Neighbourhood));
+
 -- LISTING_AMENITY table (covering various amenities across listings)
 INSERT INTO ListingAmenity (listing_id, amenity) VALUES
 -- Listing 101 amenities
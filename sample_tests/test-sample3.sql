@@ -22,7 +22,6 @@ VALUES (
 );
 
 INSERT INTO Neighbourhood (
-  neighbourhood_id,
   listing_id,
   name,
   neighbourhood_group,
@@ -30,5 +29,5 @@ INSERT INTO Neighbourhood (
   longitude
 )
 VALUES (
-  (SELECT COALESCE(MAX(neighbourhood_id), 0) + 1 FROM Neighbourhood),124,'Church Hills','Toronto',43.6532,79.3832 
+  124,'Church Hills','Toronto',43.6532,79.3832 
 );
\ No newline at end of file
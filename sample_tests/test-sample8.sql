@@ -15,10 +15,10 @@ INSERT INTO Listing (
 
 -- Insert corresponding neighborhood data
 INSERT INTO Neighbourhood (
-    neighbourhood_id, listing_id, name, neighbourhood_group, 
+    listing_id, name, neighbourhood_group, 
     latitude, longitude
 ) VALUES (
-    999998, 999998, 'Downtown', 'Central Toronto', 43.6532, -79.3832
+    999998, 'Downtown', 'Central Toronto', 43.6532, -79.3832
 );
 
 -- Query to show the notifications that were automatically created by the trigger